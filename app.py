@@ -2,20 +2,56 @@ import os
 import time
 import logging
 import secrets
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session, flash
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Flask, Response, render_template, request, jsonify, redirect, url_for, session, flash
+from flask.json.provider import JSONProvider
+import orjson
+from flask_compress import Compress
+from werkzeug.security import check_password_hash
+from argon2 import PasswordHasher
+from argon2.exceptions import VerificationError, InvalidHash
 from phi.agent import Agent
 from phi.tools.crawl4ai_tools import Crawl4aiTools
 from phi.model.google import Gemini
 from dotenv import load_dotenv
-import traceback
 import re
+import json
+import hashlib
+import zlib
+import threading
+import uuid
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from typing import Optional, Protocol
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
+from sqlalchemy import select, update, bindparam
+from datetime import datetime, timedelta
+
+try:
+    import google.generativeai as genai
+    from google.generativeai import caching as genai_caching
+    from google.api_core import exceptions as google_exceptions
+except ImportError:  # Explicit context caching is optional
+    genai = None
+
+try:
+    import redis
+except ImportError:  # Redis backend is optional
+    redis = None
+
+try:
+    import numpy as np
+    from sentence_transformers import SentenceTransformer
+except ImportError:  # Semantic cache matching is optional
+    SentenceTransformer = None
+
+# Load environment variables (before logging so LOG_LEVEL can live in .env)
+load_dotenv()
 
 # Configure logging
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
     format='%(asctime)s - %(levelname)s - %(message)s',
     handlers=[
         logging.StreamHandler(),
@@ -24,15 +60,52 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-load_dotenv()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 if not GOOGLE_API_KEY:
     logger.critical("GOOGLE_API_KEY not found in .env file")
     raise ValueError("GOOGLE_API_KEY not found in .env file")
+if genai is not None:
+    genai.configure(api_key=GOOGLE_API_KEY)
+
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson, used by jsonify for large payloads"""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Hand orjson's bytes straight to the response, skipping a decode/encode
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj), mimetype="application/json")
 
 app = Flask(__name__)
-app.secret_key = secrets.token_hex(16)  # For session management
+app.json = OrjsonProvider(app)
+
+# Compress scraped content and analyses, which can run to several MB
+app.config['COMPRESS_MIMETYPES'] = ['application/json', 'text/html']
+app.config['COMPRESS_MIN_SIZE'] = 1024
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+# Flask-Compress would buffer a streamed body to compress it whole, undoing
+# the point of streaming large /scrape responses; those are gzipped chunk by
+# chunk in _streamed_response instead
+app.config['COMPRESS_STREAMS'] = False
+Compress(app)
+# Number of server processes; gunicorn.conf.py exports this for the workers
+WEB_WORKERS = int(os.getenv("WEB_CONCURRENCY", 1))
+
+# Sessions must be signed with the same key in every gunicorn worker
+app.secret_key = os.getenv("SECRET_KEY")
+if not app.secret_key:
+    if WEB_WORKERS > 1:
+        # A per-process random key would make each worker reject the others' cookies
+        logger.critical("SECRET_KEY must be set when running more than one worker")
+        raise ValueError("SECRET_KEY must be set when running more than one worker")
+    logger.warning("SECRET_KEY not set; sessions won't survive restarts")
+    app.secret_key = secrets.token_hex(16)
+app.config['PROPAGATE_EXCEPTIONS'] = True  # Let gunicorn log unhandled errors
 
 # Database configuration
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///users.db'
@@ -42,7 +115,8 @@ db = SQLAlchemy(app)
 # User model
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(80), unique=True, nullable=False)
+    # Explicit unique index (ix_user_username) so login lookups stay O(log n) on any backend
+    username = db.Column(db.String(80), unique=True, index=True, nullable=False)
     password_hash = db.Column(db.String(120), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
@@ -53,39 +127,662 @@ class User(db.Model):
 with app.app_context():
     db.create_all()
 
+_LOGIN_STMT = select(User.password_hash).where(User.username == bindparam('u'))
+_EXISTS_STMT = select(User.id).where(User.username == bindparam('u'))
+
+@functools.lru_cache(maxsize=1024)
+def _cached_password_hash(username):
+    password_hash = db.session.execute(_LOGIN_STMT, {'u': username}).scalar()
+    if password_hash is None:
+        # lru_cache doesn't store exceptions, so unknown users are never cached
+        # and a signup from another worker is picked up immediately
+        raise LookupError(username)
+    return password_hash
+
+_password_hasher = PasswordHasher()
+
+def hash_password(password):
+    return _password_hasher.hash(password)
+
+def verify_password(password_hash, password):
+    """Return (matches, needs_rehash) for password against a stored hash"""
+    if not password_hash.startswith("$argon2"):
+        # Werkzeug PBKDF2/scrypt hash from before the switch to argon2
+        return check_password_hash(password_hash, password), True
+    try:
+        _password_hasher.verify(password_hash, password)
+    except (VerificationError, InvalidHash):
+        return False, False
+    return True, _password_hasher.check_needs_rehash(password_hash)
+
+def rehash_password(username, password):
+    """Store a fresh argon2 hash for username after a successful login"""
+    db.session.execute(
+        update(User).where(User.username == username).values(password_hash=hash_password(password))
+    )
+    db.session.commit()
+    _cached_password_hash.cache_clear()
+
+def user_exists(username):
+    return db.session.execute(_EXISTS_STMT, {'u': username}).first() is not None
+
+def get_password_hash(username):
+    """Return the stored password hash for username, or None if there is no such user"""
+    try:
+        return _cached_password_hash(username)
+    except LookupError:
+        return None
+
 # Constants
 MAX_CONTENT_LENGTH = 10 * 1024 * 1024  # 10MB
+GEMINI_MODEL_ID = "gemini-2.0-flash-exp"
+GEMINI_TEMPERATURE = 0.2
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", 3600))  # 1 hour
+LLM_CACHE_MAX_ENTRIES = 1024
+SEMANTIC_CACHE_THRESHOLD = 0.92
+SEMANTIC_CACHE_SCAN_LIMIT = 256  # Only compare against the most recent entries
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+BACKGROUND_JOB_WORKERS = int(os.getenv("BACKGROUND_JOB_WORKERS", 8))
+JOB_RESULT_TTL = 600  # Seconds a finished job's result is kept for polling
+JOB_STORE_MAX_ENTRIES = 256
+JOB_STORE_MAX_BYTES = int(os.getenv("JOB_STORE_MAX_BYTES", 64 * 1024 * 1024))  # Results can be whole pages
+MAX_BATCH_PROMPTS = 20
+STREAM_THRESHOLD = 1024 * 1024  # Stream /scrape bodies larger than 1MB
+STREAM_CHUNK_SIZE = 64 * 1024
+OUTBOUND_WORKERS = int(os.getenv("OUTBOUND_WORKERS", 16))
+OUTBOUND_TIMEOUT = 120  # Seconds to wait for a single Gemini/Crawl4ai call
+GEMINI_RATE_LIMIT = float(os.getenv("GEMINI_RATE_LIMIT", 15))  # Calls per second
+SCRAPE_CACHE_TTL = int(os.getenv("SCRAPE_CACHE_TTL", 600))  # 10 minutes
+SCRAPE_CACHE_MAX_ENTRIES = 128
+SCRAPE_CACHE_MAX_BYTES = int(os.getenv("SCRAPE_CACHE_MAX_BYTES", 64 * 1024 * 1024))  # Per worker
+SCRAPE_CACHE_MAX_PAGE_BYTES = 2 * 1024 * 1024  # Larger pages aren't cached
+CONTEXT_CACHE_MIN_TOKENS = 2048  # Gemini rejects smaller cached contents
+CONTEXT_CACHE_TTL = timedelta(minutes=10)
+CHARS_PER_TOKEN = 4  # Rough estimate, avoids a count_tokens round-trip
+MAX_CONTEXT_TOKENS = int(os.getenv("MAX_CONTEXT_TOKENS", 200000))  # Budget for scraped content per prompt
+
+# Response-cleaning patterns, compiled once instead of on every /analyze call.
+# Stdlib re beats the third-party regex engine on these short lazy patterns,
+# so there is no need to swap engines or hand-roll a compiled cleanup pass.
+_EMPHASIS_RE = re.compile(r'(?<!\*)\*(?!\*)(.+?)(?<!\*)\*(?!\*)')
+_SPACES_RE = re.compile(r'(?<=\S)[^\S\n]+')
+_BLANK_LINES_RE = re.compile(r'\n\s*\n')
+_BATCH_MARKER_RE = re.compile(r'^\s*\[\[Q(\d+)\]\][ \t]*', re.MULTILINE)
+
+
+class CacheBackend(Protocol):
+    """Storage used by LLMCache for exact-match entries"""
+
+    def get(self, key: str) -> Optional[dict]: ...
+
+    def set(self, key: str, value: dict, ttl: int) -> None: ...
+
+
+class InMemoryLRUBackend:
+    """Thread-safe in-process LRU cache with per-entry expiry
+
+    With max_bytes set, sizeof(value) is charged against a total byte budget
+    and the least recently used entries are evicted to stay under it.
+    """
+
+    def __init__(self, max_entries=LLM_CACHE_MAX_ENTRIES, max_bytes=None, sizeof=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _pop(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, value, _ = item
+            if expires_at < time.monotonic():
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        size = self.sizeof(value) if self.sizeof else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            # Too big to keep; don't leave an older value behind under this key
+            with self._lock:
+                if key in self._entries:
+                    self._pop(key)
+            return
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            self._entries[key] = (time.monotonic() + ttl, value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or (
+                self.max_bytes is not None and self._bytes > self.max_bytes
+            ):
+                self._pop(next(iter(self._entries)))
+
+
+class RedisBackend:
+    """Redis-backed cache so entries are shared between worker processes"""
+
+    def __init__(self, url, prefix="llm-cache:", fail_open=True):
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        # Caches can shrug off an outage; stores that hold real state (jobs) can't
+        self.fail_open = fail_open
+
+    def get(self, key):
+        try:
+            raw = self.client.get(self.prefix + key)
+        except redis.RedisError as e:
+            if not self.fail_open:
+                raise
+            # A cache outage shouldn't take the request down with it
+            logger.warning("Redis get failed, treating as cache miss: %s", e)
+            return None
+        return json.loads(raw) if raw else None
+
+    def set(self, key, value, ttl):
+        try:
+            self.client.setex(self.prefix + key, ttl, json.dumps(value))
+        except redis.RedisError as e:
+            if not self.fail_open:
+                raise
+            logger.warning("Redis set failed, entry not cached: %s", e)
+
+
+class LLMCache:
+    """Two-tier response cache: exact SHA-256 match, then embedding similarity"""
+
+    def __init__(self, backend, ttl=LLM_CACHE_TTL, threshold=SEMANTIC_CACHE_THRESHOLD):
+        self.backend = backend
+        self.ttl = ttl
+        self.threshold = threshold
+        self._encoder = None
+        self._encoder_failed = SentenceTransformer is None
+        # Recent {key: (expires_at, content_hash, embedding, response)} for semantic lookup
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(content_hash, prompt):
+        payload = json.dumps({
+            "model": GEMINI_MODEL_ID,
+            "content": content_hash,
+            "prompt": prompt,
+            "temperature": GEMINI_TEMPERATURE,
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _get_encoder(self):
+        """Load the embedding model once, or return None if it's unavailable"""
+        with self._lock:
+            if self._encoder is None and not self._encoder_failed:
+                try:
+                    self._encoder = SentenceTransformer(EMBEDDING_MODEL_NAME)
+                except Exception as e:
+                    logger.warning("Semantic cache disabled, embedding model unavailable: %s", e)
+                    self._encoder_failed = True
+            return self._encoder
+
+    def _embed(self, prompt):
+        """Return a normalized prompt embedding, or None when no encoder is available"""
+        encoder = self._get_encoder()
+        if encoder is None:
+            return None
+        return encoder.encode(prompt, normalize_embeddings=True)
+
+    def lookup(self, content, prompt):
+        """Return (response, key, semantic); response is None on a miss
+
+        semantic is the (content_hash, embedding) pair to hand back to store().
+        """
+        content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        key = self.make_key(content_hash, prompt)
+        hit = self.backend.get(key)
+        if hit is not None:
+            return hit["response"], key, None
+
+        # Only the prompt is fuzzy-matched: candidates must come from the exact
+        # same content, otherwise pages sharing a header would answer for each other
+        embedding = self._embed(prompt)
+        if embedding is None:
+            return None, key, None
+        now = time.monotonic()
+        with self._lock:
+            candidates = [
+                (vector, response)
+                for expires_at, entry_hash, vector, response in reversed(self._recent.values())
+                if entry_hash == content_hash and expires_at >= now
+            ]
+        for vector, response in candidates:
+            if float(np.dot(vector, embedding)) >= self.threshold:
+                return response, key, (content_hash, embedding)
+        return None, key, (content_hash, embedding)
+
+    def store(self, key, response, semantic=None):
+        entry = {"response": response}
+        if semantic is not None:
+            content_hash, embedding = semantic
+            entry["embedding"] = embedding.tolist()
+            with self._lock:
+                self._recent[key] = (time.monotonic() + self.ttl, content_hash, embedding, response)
+                self._recent.move_to_end(key)
+                while len(self._recent) > SEMANTIC_CACHE_SCAN_LIMIT:
+                    self._recent.popitem(last=False)
+        self.backend.set(key, entry, self.ttl)
+
+
+def _build_llm_cache():
+    redis_url = os.getenv("REDIS_URL")
+    if redis_url and redis is not None:
+        logger.info("Using Redis backend for LLM response cache")
+        return LLMCache(RedisBackend(redis_url))
+    return LLMCache(InMemoryLRUBackend())
+
+
+llm_cache = _build_llm_cache()
+
+class RateLimiter:
+    """Token bucket limiting how often outbound calls may start"""
+
+    def __init__(self, rate, burst=None):
+        if rate <= 0:
+            raise ValueError(f"Rate limit must be positive, got {rate}")
+        self.rate = rate
+        # At least one token, or rates below 1/s could never fill the bucket
+        self.capacity = max(1, burst or rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# All blocking Gemini/Crawl4ai calls run on this bounded pool so upstream
+# concurrency doesn't grow with the number of request threads
+_OUTBOUND = ThreadPoolExecutor(max_workers=OUTBOUND_WORKERS, thread_name_prefix="outbound")
+_gemini_limiter = RateLimiter(GEMINI_RATE_LIMIT)
+
+def submit_outbound(fn, *args, limiter=None):
+    """Queue fn(*args) on the outbound pool after taking a rate-limit token"""
+    if limiter is not None:
+        limiter.acquire()
+    return _OUTBOUND.submit(fn, *args)
+
+def call_outbound(fn, *args, limiter=None):
+    """Run fn(*args) on the outbound pool and wait for the result"""
+    return submit_outbound(fn, *args, limiter=limiter).result(timeout=OUTBOUND_TIMEOUT)
+
+# Bounded by total size too: entries are whole pages and every worker keeps its own copy
+_scrape_cache = InMemoryLRUBackend(
+    max_entries=SCRAPE_CACHE_MAX_ENTRIES,
+    max_bytes=SCRAPE_CACHE_MAX_BYTES,
+    sizeof=lambda entry: len(entry["content"]),
+)
+
+def normalize_url(url):
+    """Canonical form of url for cache keys: lowercase host, sorted query, no fragment"""
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or "/", query, ""))
+
+# Crawl4aiTools holds only configuration, so one instance serves every request
+_CRAWLER = Crawl4aiTools(max_length=None)
+# Strings web_crawler returns in place of page content
+_CRAWLER_NO_CONTENT = frozenset({"No result", "No URL provided"})
+
+def scrape_website(url, debug_id="DEBUG", refresh=False):
+    """Scrape website content using Crawl4aiTools, reusing recent results unless refresh is set"""
+    cache_key = hashlib.sha256(normalize_url(url).encode("utf-8")).hexdigest()
+    if not refresh:
+        cached = _scrape_cache.get(cache_key)
+        if cached is not None:
+            logger.debug("[%s] Scrape cache hit", debug_id)
+            return cached["content"]
 
-def scrape_website(url, debug_id="DEBUG"):
-    """Scrape website content using Crawl4aiTools"""
     try:
-        logger.debug(f"[{debug_id}] Starting scrape with Crawl4aiTools")
-        crawler = Crawl4aiTools(max_length=None)
-        scraped_data = crawler.web_crawler(url)
-        logger.debug(f"[{debug_id}] Scrape completed successfully")
+        logger.debug("[%s] Starting scrape with Crawl4aiTools", debug_id)
+        scraped_data = call_outbound(_CRAWLER.web_crawler, url)
+        if not scraped_data or scraped_data in _CRAWLER_NO_CONTENT:
+            # web_crawler reports DNS errors, timeouts and empty pages as a
+            # string rather than raising; fail here so it's never cached
+            raise RuntimeError(f"No content could be scraped from {url}")
+        logger.debug("[%s] Scrape completed successfully", debug_id)
+        if len(scraped_data) <= SCRAPE_CACHE_MAX_PAGE_BYTES:
+            _scrape_cache.set(cache_key, {"content": scraped_data}, SCRAPE_CACHE_TTL)
         return scraped_data
     except Exception as e:
-        logger.error(f"[{debug_id}] Scraping failed: {str(e)}")
+        logger.error("[%s] Scraping failed: %s", debug_id, e)
         raise
 
+def analyze_with_cache(content, prompt, debug_id="DEBUG"):
+    """Return the cleaned Gemini analysis, serving from llm_cache when possible"""
+    analysis, cache_key, semantic = llm_cache.lookup(content, prompt)
+    if analysis is not None:
+        logger.debug("[%s] LLM cache hit", debug_id)
+        return analysis
+    logger.debug("[%s] Getting structured Gemini response...", debug_id)
+    analysis = get_structured_gemini_response(content, prompt)
+    llm_cache.store(cache_key, analysis, semantic)
+    return analysis
+
+# Background jobs so slow scrapes/analyses don't pin a request thread. Work
+# runs in this process; job records go to Redis when available so any worker
+# can answer a status poll. Records: {"owner", "status", "result"/"error"}
+_job_executor = ThreadPoolExecutor(max_workers=BACKGROUND_JOB_WORKERS, thread_name_prefix="job")
+
+def _job_record_size(record):
+    return len(record.get("result") or "")
+
+def _build_job_store():
+    redis_url = os.getenv("REDIS_URL")
+    if redis_url and redis is not None:
+        return RedisBackend(redis_url, prefix="job:", fail_open=False)
+    return InMemoryLRUBackend(
+        max_entries=JOB_STORE_MAX_ENTRIES,
+        max_bytes=JOB_STORE_MAX_BYTES,
+        sizeof=_job_record_size,
+    )
+
+_job_store = _build_job_store()
+
+def async_jobs_available():
+    """Jobs kept in process memory are only visible to polls that hit the same worker"""
+    return isinstance(_job_store, RedisBackend) or WEB_WORKERS <= 1
+
+def submit_job(fn, *args):
+    """Run fn(*args) in the background and return its job id"""
+    job_id = uuid.uuid4().hex
+    owner = session["user"]
+    _job_store.set(job_id, {"owner": owner, "status": "pending"}, JOB_RESULT_TTL)
+
+    def run():
+        try:
+            record = {"owner": owner, "status": "success", "result": fn(*args)}
+            if isinstance(_job_store, InMemoryLRUBackend) and _job_record_size(record) > JOB_STORE_MAX_BYTES:
+                # The in-memory store would drop it; tell the poller instead
+                record = {"owner": owner, "status": "error", "error": "Result too large to keep; retry without async"}
+        except Exception as e:
+            logger.exception("Background job %s failed", job_id)
+            record = {"owner": owner, "status": "error", "error": str(e)}
+        try:
+            _job_store.set(job_id, record, JOB_RESULT_TTL)
+        except Exception:
+            logger.exception("Could not store result of background job %s", job_id)
+
+    _job_executor.submit(run)
+    return job_id
+
+def job_status_response(job_id, result_key):
+    """Build the JSON response describing a background job"""
+    job = _job_store.get(job_id)
+    if job is None or job["owner"] != session["user"]:
+        return jsonify({"error": "Unknown job", "status": "error"}), 404
+
+    if job["status"] == "pending":
+        return jsonify({"job_id": job_id, "status": "pending"})
+    if job["status"] == "error":
+        return jsonify({
+            "error": f"Job failed: {job['error']}",
+            "status": "error",
+            "job_id": job_id
+        }), 500
+    return jsonify({result_key: job["result"], "status": "success", "job_id": job_id})
+
+def async_unavailable_response(debug_id):
+    logger.warning("[%s] Background job refused: several workers and no shared job store", debug_id)
+    return jsonify({
+        "error": "Background jobs need REDIS_URL when running more than one worker",
+        "status": "error",
+        "debug_id": debug_id
+    }), 503
+
+# Agent keeps per-run state, so share one instance per worker thread rather
+# than rebuilding the model client (and its HTTP session) on every request
+_agent_local = threading.local()
+
+def _get_gemini_agent():
+    """Return this thread's Gemini agent, creating it on first use"""
+    agent = getattr(_agent_local, "agent", None)
+    if agent is None:
+        agent = Agent(model=Gemini(id=GEMINI_MODEL_ID, temperature=GEMINI_TEMPERATURE))
+        _agent_local.agent = agent
+    return agent
+
+def _run_agent(full_prompt):
+    """Run a prompt through this thread's agent and return the response text"""
+    agent = _get_gemini_agent()
+    try:
+        response = agent.run(full_prompt)  # Get raw response
+    finally:
+        # Each request is independent; don't let run history pile up
+        agent.memory.clear()
+
+    # RunResponse carries the model text in .content; only fall back to
+    # slicing its repr if that isn't a plain string
+    content = getattr(response, "content", None)
+    if isinstance(content, str):
+        return content
+    return str(response).partition("content_type=")[0]
+
+def _clean_response(response_str):
+    """Turn raw model output into markdown in as few passes as possible"""
+    cleaned_content = response_str.strip()
+
+    # Replace single asterisks used for emphasis with bold tags; the substring
+    # check is far cheaper than a regex scan over the whole response
+    if '*' in cleaned_content:
+        cleaned_content = _EMPHASIS_RE.sub(r'**\1**', cleaned_content)
+
+    # Markdown needs two spaces for line breaks. This is the only literal
+    # substitution; if more are added, fold them into one str.translate table.
+    if '\n' in cleaned_content:
+        cleaned_content = cleaned_content.replace('\n', '  \n')
+    return cleaned_content
+
+# Gemini context cache handles keyed by sha256(content): {hash: (cache, expires_at)}
+_context_caches = {}
+# Content whose cache creation failed recently: {hash: retry_after}
+_context_cache_failures = {}
+_context_caches_lock = threading.Lock()
+# Set once the API rejects caching for the model itself; no page can succeed then
+_context_caching_disabled = False
+
+def _is_model_level_error(error):
+    """Whether a CachedContent.create failure applies to the model rather than the content"""
+    if isinstance(error, (
+        google_exceptions.NotFound,
+        google_exceptions.PermissionDenied,
+        google_exceptions.MethodNotImplemented,
+    )):
+        return True
+    return "not supported" in str(error).lower()
+
+def _context_cache_key(content):
+    """Return sha256(content) if content should go through context caching, else None"""
+    if genai is None or _context_caching_disabled:
+        return None
+    if len(content) < CONTEXT_CACHE_MIN_TOKENS * CHARS_PER_TOKEN:
+        return None
+    content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    with _context_caches_lock:
+        retry_after = _context_cache_failures.get(content_hash)
+    if retry_after and retry_after > datetime.utcnow():
+        return None
+    return content_hash
+
+def _get_context_cache(content, content_hash):
+    """Return a Gemini cached-content handle for content, or None if it can't be created"""
+    global _context_caching_disabled
+    now = datetime.utcnow()
+    with _context_caches_lock:
+        entry = _context_caches.get(content_hash)
+        if entry and entry[1] > now:
+            return entry[0]
+        _context_caches.pop(content_hash, None)
+
+    try:
+        cache = genai_caching.CachedContent.create(
+            model=f"models/{GEMINI_MODEL_ID}",
+            system_instruction="Answer questions based on this website content.",
+            contents=[content],
+            ttl=CONTEXT_CACHE_TTL,
+        )
+    except Exception as e:
+        if _is_model_level_error(e):
+            logger.warning("Context caching rejected for %s, disabling it: %s", GEMINI_MODEL_ID, e)
+            _context_caching_disabled = True
+            return None
+        # Content-level failures (e.g. under the server's minimum size) won't
+        # fix themselves, so don't retry this content until the TTL passes
+        logger.warning("Context cache creation failed, using full prompts for this content: %s", e)
+        with _context_caches_lock:
+            for stale_hash in [h for h, t in _context_cache_failures.items() if t <= now]:
+                del _context_cache_failures[stale_hash]
+            _context_cache_failures[content_hash] = now + CONTEXT_CACHE_TTL
+        return None
+
+    # Expire our handle slightly early so we never reference a deleted cache
+    expires_at = now + CONTEXT_CACHE_TTL - timedelta(seconds=30)
+    with _context_caches_lock:
+        for stale_hash in [h for h, (_, t) in _context_caches.items() if t <= now]:
+            del _context_caches[stale_hash]
+        _context_caches[content_hash] = (cache, expires_at)
+    return cache
+
+def _generate_from_cache(cache, prompt):
+    """Run prompt against an existing context cache and return the response text"""
+    model = genai.GenerativeModel.from_cached_content(cached_content=cache)
+    response = model.generate_content(
+        prompt,
+        generation_config={"temperature": GEMINI_TEMPERATURE},
+    )
+    return response.text
+
+def _generate_with_context_cache(content, prompt, content_hash):
+    """Run prompt against cached content; returns None if caching isn't usable"""
+    cache = _get_context_cache(content, content_hash)
+    if cache is None:
+        return None
+    try:
+        return _generate_from_cache(cache, prompt)
+    except Exception as e:
+        logger.warning("Context cache unavailable, sending full prompt: %s", e)
+        with _context_caches_lock:
+            _context_caches.pop(content_hash, None)
+        return None
+
+def prepare_content(content):
+    """Collapse redundant whitespace and trim content to the prompt token budget"""
+    # Keep line breaks and indentation (scraped content is markdown) but squeeze
+    # runs of spaces and blank lines, which cost tokens without adding meaning
+    content = _SPACES_RE.sub(' ', content)
+    content = _BLANK_LINES_RE.sub('\n\n', content)
+    max_chars = MAX_CONTEXT_TOKENS * CHARS_PER_TOKEN
+    if len(content) > max_chars:
+        content = content[:max_chars]
+    return content
+
+def _full_prompt(content, prompt):
+    return f"Based on this website content:\n\n{content}\n\n{prompt}"
+
 def get_structured_gemini_response(content, prompt):
     """Analyze scraped content with Gemini and return cleaned response"""
-    agent = Agent(model=Gemini(id="gemini-2.0-flash-exp", temperature=0.2))
-    full_prompt = f"Based on this website content:\n\n{content}\n\n{prompt}"
-    
-    response = agent.run(full_prompt)  # Get raw response
-    response_str = str(response)  # Ensure response is a string
+    content = prepare_content(content)
+    response_str = None
+    content_hash = _context_cache_key(content)
+    if content_hash is not None:
+        response_str = call_outbound(
+            _generate_with_context_cache, content, prompt, content_hash, limiter=_gemini_limiter
+        )
+    if response_str is None:
+        response_str = call_outbound(_run_agent, _full_prompt(content, prompt), limiter=_gemini_limiter)
 
-    # Clean the response
-    cleaned_content = response_str.split("content_type=")[0].strip()
-    
-    # Replace single asterisks used for emphasis with bold tags
-    cleaned_content = re.sub(r'(?<!\*)\*(?!\*)(.+?)(?<!\*)\*(?!\*)', r'**\1**', cleaned_content)
-    
-    # Replace newlines with markdown line breaks
-    cleaned_content = cleaned_content.replace('\n', '  \n')  # Markdown needs two spaces for line breaks
-    
-    return cleaned_content
+    return _clean_response(response_str)
+
+def _batch_prompt(content, prompts):
+    """Build one prompt that asks every question and marks each answer"""
+    questions = "\n".join(f"Q{i}: {p}" for i, p in enumerate(prompts, 1))
+    return (
+        f"Answer the following {len(prompts)} questions about the website content below. "
+        "Start each answer on its own line with a marker like [[Q1]], [[Q2]], ... "
+        "and write nothing before the first marker.\n\n"
+        f"Content:\n{content}\n\n{questions}"
+    )
+
+def _split_batch_response(response_str, count):
+    """Split a marked batch response into answers, or None if markers are missing"""
+    parts = _BATCH_MARKER_RE.split(response_str)
+    # split() yields [preamble, n1, answer1, n2, answer2, ...]
+    answers = {int(n): answer for n, answer in zip(parts[1::2], parts[2::2])}
+    if sorted(answers) != list(range(1, count + 1)):
+        return None
+    return [_clean_response(answers[i]) for i in range(1, count + 1)]
+
+def _answer_in_one_call(content, prompts, debug_id):
+    """Ask every prompt about already-prepared content in a single numbered Gemini call"""
+    logger.debug("[%s] Sending %s prompts in one Gemini call", debug_id, len(prompts))
+    response_str = call_outbound(_run_agent, _batch_prompt(content, prompts), limiter=_gemini_limiter)
+    answers = _split_batch_response(response_str, len(prompts))
+    if answers is None:
+        logger.warning("[%s] Batch response missing markers, answering prompts one by one", debug_id)
+        futures = [
+            submit_outbound(_run_agent, _full_prompt(content, p), limiter=_gemini_limiter)
+            for p in prompts
+        ]
+        answers = [_clean_response(f.result(timeout=OUTBOUND_TIMEOUT)) for f in futures]
+    return answers
+
+def get_batch_gemini_responses(content, prompts, debug_id="DEBUG"):
+    """Answer several prompts about the same content with as few Gemini calls as possible"""
+    # Prepare (and hash) the content once; eligibility for context caching is
+    # decided on the squeezed text that is actually sent
+    content = prepare_content(content)
+    content_hash = _context_cache_key(content)
+    cache = None
+    if content_hash is not None:
+        # Upload the content once up front; fanning out first would have every
+        # prompt miss and create its own copy of the cache
+        cache = call_outbound(_get_context_cache, content, content_hash, limiter=_gemini_limiter)
+    if cache is None:
+        return _answer_in_one_call(content, prompts, debug_id)
+
+    logger.debug("[%s] Running %s prompts against cached context", debug_id, len(prompts))
+    futures = [submit_outbound(_generate_from_cache, cache, p, limiter=_gemini_limiter) for p in prompts]
+    answers = []
+    failed = []
+    for i, future in enumerate(futures):
+        try:
+            answers.append(_clean_response(future.result(timeout=OUTBOUND_TIMEOUT)))
+        except Exception as e:
+            logger.warning("[%s] Cached-context prompt %s failed: %s", debug_id, i + 1, e)
+            answers.append(None)
+            failed.append(i)
+    if failed:
+        with _context_caches_lock:
+            _context_caches.pop(content_hash, None)
+        retried = _answer_in_one_call(content, [prompts[i] for i in failed], debug_id)
+        for i, answer in zip(failed, retried):
+            answers[i] = answer
+    return answers
 
 @app.route("/")
 def index():
@@ -103,8 +800,11 @@ def login():
         username = request.form.get("username")
         password = request.form.get("password")
         
-        user = User.query.filter_by(username=username).first()
-        if user and check_password_hash(user.password_hash, password):
+        password_hash = get_password_hash(username)
+        matches, needs_rehash = verify_password(password_hash, password) if password_hash else (False, False)
+        if matches:
+            if needs_rehash:
+                rehash_password(username, password)
             session["user"] = username
             flash("Logged in successfully!", "success")
             return redirect(url_for("index"))
@@ -117,13 +817,12 @@ def signup():
         username = request.form.get("username")
         password = request.form.get("password")
         
-        existing_user = User.query.filter_by(username=username).first()
-        if existing_user:
+        if user_exists(username):
             flash("Username already exists", "danger")
         else:
             new_user = User(
                 username=username,
-                password_hash=generate_password_hash(password)
+                password_hash=hash_password(password)
             )
             db.session.add(new_user)
             db.session.commit()
@@ -138,17 +837,48 @@ def logout():
     flash("Logged out successfully!", "info")
     return redirect(url_for("home"))
 
+def _iter_chunks(text):
+    for start in range(0, len(text), STREAM_CHUNK_SIZE):
+        yield text[start:start + STREAM_CHUNK_SIZE]
+
+def _gzip_stream(chunks):
+    """Gzip a stream of str/bytes chunks incrementally"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def _streamed_response(chunks, mimetype):
+    """Stream chunks to the client, gzipped on the fly when it accepts gzip"""
+    headers = {"Vary": "Accept-Encoding"}
+    if "gzip" in request.accept_encodings:
+        chunks = _gzip_stream(chunks)
+        headers["Content-Encoding"] = "gzip"
+    return Response(chunks, mimetype=mimetype, headers=headers)
+
+def _stream_scrape_json(content, debug_id):
+    """Yield the /scrape success body piece by piece instead of one big JSON string"""
+    yield b'{"content":"'
+    for chunk in _iter_chunks(content):
+        # Encode each slice as a JSON string and drop its surrounding quotes
+        yield orjson.dumps(chunk)[1:-1]
+    yield b'","status":"success","debug_id":' + orjson.dumps(debug_id) + b'}'
+
 @app.route("/scrape", methods=["POST"])
 def scrape_url():
     if "user" not in session:
         return jsonify({"error": "Authentication required", "status": "error"}), 401
         
     debug_id = f"SCRAPE-{time.time_ns()}"
-    logger.debug(f"[{debug_id}] Starting scrape request")
+    logger.debug("[%s] Starting scrape request", debug_id)
     
     url = request.form.get("url", "").strip()
     if not url:
-        logger.warning(f"[{debug_id}] Empty URL provided")
+        logger.warning("[%s] Empty URL provided", debug_id)
         return jsonify({
             "error": "URL is required",
             "status": "error",
@@ -158,11 +888,24 @@ def scrape_url():
     try:
         if not url.startswith(('http://', 'https://')):
             url = f'https://{url}'
-            logger.debug(f"[{debug_id}] Added https prefix: {url}")
+            logger.debug("[%s] Added https prefix: %s", debug_id, url)
+        refresh = request.values.get("refresh") == "1"
+
+        if request.form.get("async") == "1":
+            if not async_jobs_available():
+                return async_unavailable_response(debug_id)
+            job_id = submit_job(scrape_website, url, debug_id, refresh)
+            logger.debug("[%s] Queued scrape job %s", debug_id, job_id)
+            return jsonify({"job_id": job_id, "status": "pending", "debug_id": debug_id}), 202
 
         # Scrape content
-        logger.debug(f"[{debug_id}] Scraping content...")
-        scraped_content = scrape_website(url, debug_id)
+        logger.debug("[%s] Scraping content...", debug_id)
+        scraped_content = scrape_website(url, debug_id, refresh)
+
+        if request.accept_mimetypes.best_match(["application/json", "text/plain"]) == "text/plain":
+            return _streamed_response(_iter_chunks(scraped_content), "text/plain")
+        if len(scraped_content) > STREAM_THRESHOLD:
+            return _streamed_response(_stream_scrape_json(scraped_content, debug_id), "application/json")
         
         return jsonify({
             "content": scraped_content,
@@ -171,27 +914,32 @@ def scrape_url():
         })
 
     except Exception as e:
-        logger.error(f"[{debug_id}] Scraping failed: {str(e)}")
-        logger.debug(f"[{debug_id}] Full traceback:\n{traceback.format_exc()}")
+        logger.exception("[%s] Scraping failed", debug_id)
         return jsonify({
             "error": f"Scraping failed: {str(e)}",
             "status": "error",
             "debug_id": debug_id
         }), 500
 
+@app.route("/scrape/status/<job_id>")
+def scrape_status(job_id):
+    if "user" not in session:
+        return jsonify({"error": "Authentication required", "status": "error"}), 401
+    return job_status_response(job_id, "content")
+
 @app.route("/analyze", methods=["POST"])
 def analyze_content():
     if "user" not in session:
         return jsonify({"error": "Authentication required", "status": "error"}), 401
         
     debug_id = f"ANALYZE-{time.time_ns()}"
-    logger.debug(f"[{debug_id}] Starting analysis request")
+    logger.debug("[%s] Starting analysis request", debug_id)
     
     content = request.form.get("content", "").strip()
     prompt = request.form.get("prompt", "").strip()
     
     if not content:
-        logger.warning(f"[{debug_id}] Empty content provided")
+        logger.warning("[%s] Empty content provided", debug_id)
         return jsonify({
             "error": "Content is required",
             "status": "error",
@@ -199,7 +947,7 @@ def analyze_content():
         }), 400
         
     if not prompt:
-        logger.warning(f"[{debug_id}] Empty prompt provided")
+        logger.warning("[%s] Empty prompt provided", debug_id)
         return jsonify({
             "error": "Prompt is required",
             "status": "error",
@@ -207,8 +955,14 @@ def analyze_content():
         }), 400
 
     try:
-        logger.debug(f"[{debug_id}] Getting structured Gemini response...")
-        analysis = get_structured_gemini_response(content, prompt)
+        if request.form.get("async") == "1":
+            if not async_jobs_available():
+                return async_unavailable_response(debug_id)
+            job_id = submit_job(analyze_with_cache, content, prompt, debug_id)
+            logger.debug("[%s] Queued analysis job %s", debug_id, job_id)
+            return jsonify({"job_id": job_id, "status": "pending"}), 202
+
+        analysis = analyze_with_cache(content, prompt, debug_id)
         
         # Return clean structured response
         return jsonify({
@@ -217,13 +971,59 @@ def analyze_content():
         })
         
     except Exception as e:
-        logger.error(f"[{debug_id}] Analysis failed: {str(e)}")
-        logger.debug(f"[{debug_id}] Full traceback:\n{traceback.format_exc()}")
+        logger.exception("[%s] Analysis failed", debug_id)
         return jsonify({
             "error": f"Analysis failed: {str(e)}",
             "status": "error"
         }), 500
     
+@app.route("/analyze/batch", methods=["POST"])
+def analyze_batch():
+    if "user" not in session:
+        return jsonify({"error": "Authentication required", "status": "error"}), 401
+
+    debug_id = f"BATCH-{time.time_ns()}"
+    logger.debug("[%s] Starting batch analysis request", debug_id)
+
+    content = request.form.get("content", "").strip()
+    prompts = [p.strip() for p in request.form.getlist("prompts") if p.strip()]
+
+    if not content:
+        logger.warning("[%s] Empty content provided", debug_id)
+        return jsonify({
+            "error": "Content is required",
+            "status": "error",
+            "debug_id": debug_id
+        }), 400
+
+    if not prompts or len(prompts) > MAX_BATCH_PROMPTS:
+        logger.warning("[%s] Invalid prompt count: %s", debug_id, len(prompts))
+        return jsonify({
+            "error": f"Between 1 and {MAX_BATCH_PROMPTS} prompts are required",
+            "status": "error",
+            "debug_id": debug_id
+        }), 400
+
+    try:
+        answers = get_batch_gemini_responses(content, prompts, debug_id)
+        return jsonify({
+            "analyses": dict(zip(prompts, answers)),
+            "status": "success"
+        })
+
+    except Exception as e:
+        logger.exception("[%s] Batch analysis failed", debug_id)
+        return jsonify({
+            "error": f"Batch analysis failed: {str(e)}",
+            "status": "error"
+        }), 500
+
+@app.route("/analyze/status/<job_id>")
+def analyze_status(job_id):
+    if "user" not in session:
+        return jsonify({"error": "Authentication required", "status": "error"}), 401
+    return job_status_response(job_id, "analysis")
+
 @app.route("/admin/db-viewer", methods=['GET', 'POST'])
 def db_viewer():
     # Check if user is logged in first
@@ -253,6 +1053,11 @@ def db_viewer():
 
 
 if __name__ == "__main__":
-    logger.info("Starting Flask application")
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    # Production runs under gunicorn (see Procfile / wsgi.py); the Werkzeug
+    # server with its debugger is only for local development
+    if os.getenv("FLASK_DEV"):
+        logger.info("Starting Flask development server")
+        app.run(debug=True, host='0.0.0.0', port=5000)
+    else:
+        logger.error("Set FLASK_DEV=1 for the development server, or run: gunicorn wsgi:app")
 
@@ -0,0 +1,12 @@
+"""Gunicorn settings used by the Procfile"""
+import os
+
+workers = int(os.getenv("WEB_CONCURRENCY", 4))
+# Export the resolved count so the app can tell it shares traffic with other
+# processes: it refuses to start without SECRET_KEY, and in-memory background
+# jobs are refused unless REDIS_URL is set
+os.environ["WEB_CONCURRENCY"] = str(workers)
+
+worker_class = "gthread"
+threads = 8
+bind = f"0.0.0.0:{os.getenv('PORT', 5000)}"
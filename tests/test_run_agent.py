@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+os.environ.setdefault("GOOGLE_API_KEY", "test-key")
+
+import app  # noqa: E402
+
+
+class FakeMemory:
+    def __init__(self):
+        self.cleared = 0
+
+    def clear(self):
+        self.cleared += 1
+
+
+class FakeResponse:
+    def __init__(self, content, text):
+        self.content = content
+        self._text = text
+
+    def __str__(self):
+        return self._text
+
+
+class FakeAgent:
+    def __init__(self, response=None, error=None):
+        self.response = response
+        self.error = error
+        self.memory = FakeMemory()
+        self.prompts = []
+
+    def run(self, prompt):
+        self.prompts.append(prompt)
+        if self.error is not None:
+            raise self.error
+        return self.response
+
+
+@pytest.fixture
+def use_agent(monkeypatch):
+    def install(agent):
+        monkeypatch.setattr(app, "_get_gemini_agent", lambda: agent)
+        return agent
+    return install
+
+
+def test_returns_content_when_it_is_a_string(use_agent):
+    use_agent(FakeAgent(FakeResponse("The answer", "ignored content_type='str'")))
+    assert app._run_agent("prompt") == "The answer"
+
+
+@pytest.mark.parametrize("content", [None, {"answer": 42}])
+def test_falls_back_to_repr_slice_when_content_is_not_a_string(use_agent, content):
+    use_agent(FakeAgent(FakeResponse(content, "The answer content_type='str' metrics={}")))
+    assert app._run_agent("prompt") == "The answer "
+
+
+def test_clears_agent_memory_after_each_run(use_agent):
+    agent = use_agent(FakeAgent(FakeResponse("ok", "ok")))
+    app._run_agent("first")
+    app._run_agent("second")
+    assert agent.prompts == ["first", "second"]
+    assert agent.memory.cleared == 2
+
+
+def test_clears_agent_memory_when_run_fails(use_agent):
+    agent = use_agent(FakeAgent(error=RuntimeError("boom")))
+    with pytest.raises(RuntimeError):
+        app._run_agent("prompt")
+    assert agent.memory.cleared == 1
@@ -0,0 +1,4 @@
+"""WSGI entry point for gunicorn"""
+from app import app
+
+__all__ = ["app"]